@@ -9,6 +9,17 @@ def get_list(text: str) -> list:
     """
     pass
 
+def get_lists(texts: list[str]) -> list[list]:
+    """ 批量括号匹配提取列表
+
+    Args:
+        texts (list[str]): 待提取字符串数组
+
+    Returns:
+        list[list]: 与输入顺序一致的列表数组
+    """
+    pass
+
 def structure(
         detections: list[tuple[str, tuple[float, ...]]],
         iou_threshold: float) -> list[tuple[str, tuple[float, ...]]]:
@@ -22,6 +22,7 @@ class VLLMConfig(TypedDict, total=False):
     tensor_parallel_size: int
     pipeline_parallel_size: int
     max_model_len: int
+    enable_prefix_caching: bool
     enable_auto_tool_choice: bool
     tool_call_parser: str
     enable_reasoning: bool
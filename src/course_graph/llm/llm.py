@@ -6,7 +6,7 @@
 
 from openai import OpenAI
 from openai.types.chat import *
-from openai import NOT_GIVEN, NotGiven
+from openai import NOT_GIVEN, NotGiven, DefaultHttpxClient
 import os
 import requests
 import subprocess
@@ -18,6 +18,7 @@ import pathlib
 import weakref
 from .config import LLMConfig, VLLMConfig
 import shlex
+from concurrent.futures import ThreadPoolExecutor
 
 
 class LLMBase:
@@ -48,6 +49,10 @@ class LLMBase:
             return
         self._instruction = value
 
+    def reset_client(self) -> None:
+        """ 使用新的连接池重建客户端, 用于 fork 出的子进程, 避免与父进程共享 HTTP 连接
+        """
+        self.client = self.client.copy(http_client=DefaultHttpxClient())
 
     def chat_completion(
         self,
@@ -163,6 +168,36 @@ class LLM(LLMBase):
         response = self.chat_completion(messages=messages)
         return response.content, None
 
+    def batch_chat(self, messages: list[str], max_workers: int = 8) -> list[tuple[str, str] | tuple[str, None]]:
+        """ 批量单轮对话, 并发提交全部请求, 由服务端 (如 vLLM 的连续批处理) 合并推理
+
+        Args:
+            messages (list[str]): 用户输入列表
+            max_workers (int, optional): 最大并发请求数. Defaults to 8.
+
+        Returns:
+            list[tuple[str, str] | tuple[str, None]]: 与输入顺序一致的模型输出, 推理过程
+        """
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(self.chat, messages))
+
+    def batch_image_chat(self,
+                         paths: list[str | list[str]],
+                         message: str,
+                         max_workers: int = 8) -> list[tuple[str, str] | tuple[str, None]]:
+        """ 基于图片批量单轮对话, 每组图片使用相同的用户输入
+
+        Args:
+            paths (list[str | list[str]]): 图片路径列表
+            message (str): 用户输入
+            max_workers (int, optional): 最大并发请求数. Defaults to 8.
+
+        Returns:
+            list[tuple[str, str] | tuple[str, None]]: 与输入顺序一致的模型输出, 推理过程
+        """
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(lambda path: self.image_chat(path, message), paths))
+
 
 class Server:
 
@@ -211,6 +246,8 @@ class Server:
 
 class VLLM(Server):
 
+    NEGATABLE_FLAGS = {'enable_prefix_caching'}  # 支持 --no-<选项> 形式的布尔选项, 其余布尔选项为 False 时不传入
+
     def __init__(self,
                  path: str,
                  *,
@@ -227,7 +264,7 @@ class VLLM(Server):
             port (int, optional): 服务端口. Defaults to 9017.
             timeout (int, optional): 启动服务超时时间. Defaults to 60.
             log (bool, optional): 输出控制台日志. Defaults to True.
-            vllm_config (VLLMConfig, optional): VLLM配置. Defaults to None.
+            vllm_config (VLLMConfig, optional): VLLM配置, 默认开启前缀缓存. Defaults to None.
         """
         
         self.host = host
@@ -243,18 +280,24 @@ class VLLM(Server):
                 --trust-remote-code
         """
         commands = shlex.split(command)
-            
-        if vllm_config:
-            for key in vllm_config.keys():
-                if type(vllm_config[key]) == bool and vllm_config[key]:
+
+        # 解析器等场景的提示词共享固定前缀, 开启前缀缓存以复用其 KV Cache
+        vllm_config = {'enable_prefix_caching': True, **(vllm_config or {})}
+        for key in vllm_config.keys():
+            if type(vllm_config[key]) == bool:
+                if vllm_config[key]:
                     commands.extend([
                         f"--{key.replace('_', '-')}"
                     ])
-                else:
+                elif key in self.NEGATABLE_FLAGS:  # 默认开启的选项需要显式关闭
                     commands.extend([
-                        f"--{key.replace('_', '-')}",
-                        str(vllm_config[key])
+                        f"--no-{key.replace('_', '-')}"
                     ])
+            else:
+                commands.extend([
+                    f"--{key.replace('_', '-')}",
+                    str(vllm_config[key])
+                ])
 
         Server.__init__(self,
                        command_list=commands,
@@ -5,6 +5,8 @@
 # Description: 使用大模型解析文档相关提示词
 
 class ParserPromptGenerator:
+    """ 文档解析提示词, 固定的说明和示例均位于提示词开头, 可变内容只追加在末尾, 以便命中推理服务的前缀缓存
+    """
 
     @staticmethod
     def get_ocr_aided_prompt(text: str) -> tuple[str, str]:
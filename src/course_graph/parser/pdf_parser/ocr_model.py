@@ -12,13 +12,17 @@ from contextlib import redirect_stdout
 import os
 import re
 import time
+from typing import Literal
 from ...llm import Qwen
+import paddle
 
 logging.getLogger("transformers").setLevel(logging.CRITICAL)
 
 
 class OCRModel(ABC):
 
+    device: str = 'cpu'  # 模型运行设备
+
     @abstractmethod
     def predict(self, img_path: str) -> str:
         """ OCR 识别
@@ -37,10 +41,24 @@ class OCRModel(ABC):
 
 class PaddleOCR(OCRModel):
 
-    def __init__(self) -> None:
+    def __init__(self,
+                 enable_mkldnn: bool = True,
+                 cpu_threads: int | None = None,
+                 precision: Literal['fp32', 'fp16', 'int8'] = 'fp32',
+                 **kwargs) -> None:
         """ 飞桨 OCR 模型 ref: https://github.com/PaddlePaddle/PaddleOCR/
+
+        Args:
+            enable_mkldnn (bool, optional): CPU 推理时启用 MKL-DNN 加速. Defaults to True.
+            cpu_threads (int | None, optional): CPU 推理线程数, 为 None 时使用 Paddle 的默认值. Defaults to None.
+            precision (Literal['fp32', 'fp16', 'int8'], optional): 推理精度, int8 需要通过 det_model_dir/rec_model_dir 指定量化模型. Defaults to 'fp32'.
+            **kwargs (dict, optional): 其它 PaddleOCR 参数.
         """
-        self.paddle = Paddle(lang="ch", show_log=False, use_angle_cls=True)
+        if cpu_threads is not None:
+            kwargs['cpu_threads'] = cpu_threads
+        self.device = paddle.device.get_device() if kwargs.get('use_gpu', True) else 'cpu'
+        self.paddle = Paddle(lang="ch", show_log=False, use_angle_cls=True,
+                             enable_mkldnn=enable_mkldnn, precision=precision, **kwargs)
 
     def predict(self, img_path: str) -> str:
         res = self.paddle.ocr(img_path)[0]
@@ -63,6 +81,7 @@ class GOT(OCRModel):
             low_cpu_mem_usage=True,
             use_safetensors=True,
             pad_token_id=self.tokenizer.eos_token_id).eval().to(device)
+        self.device = device
         
         self.unreadable_pattern = re.compile(r'[\ue000-\uf8ff\ufff0-\uffff]')
 
@@ -10,7 +10,6 @@ import shortuuid
 from ..parser import Parser
 from ..types import Page, Content, ContentType
 import fitz
-from PIL import Image
 import numpy as np
 import cv2
 import re
@@ -18,15 +17,64 @@ from ...llm import LLM
 from ...llm.prompt import VLPromptGenerator, ParserPromptGenerator
 import os
 import shutil
-from course_graph._core import get_list, get_longest_seq
+from course_graph._core import get_list, get_lists, get_longest_seq
 from ..types import BookMark, PageIndex
 from shuangchentools.utils.file import clear_directory
 from typing import Callable
 from numpy import ndarray
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import multiprocessing
+from functools import lru_cache
+from collections import OrderedDict
+import hashlib
+from loguru import logger
+
+
+# 空白字符删除表, 覆盖 re 中 \s 匹配的全部 unicode 空白字符
+_WS_TABLE = str.maketrans('', '', ''.join(
+    [chr(c) for c in (*range(0x09, 0x0E), *range(0x1C, 0x21), 0x85, 0xA0, 0x1680,
+                      *range(0x2000, 0x200B), 0x2028, 0x2029, 0x202F, 0x205F, 0x3000)]))
+_REPL_CHAR = '\ufffd'  # 直接读取文字时无法解码的替换字符
+_DIGIT_RE = re.compile(r'\d+')
+_PNG_PARAMS = [cv2.IMWRITE_PNG_COMPRESSION, 1]  # 缓存图像只用于识别, 使用最低压缩等级加快编码
+
+_worker_parser: 'PDFParser | None' = None  # 子进程中的解析器
+
+
+def _init_worker(parser: 'PDFParser') -> None:
+    """ 子进程初始化: 复用父进程中已加载的模型, 并为每个进程单独打开文档和缓存目录 (fitz 对象不能跨进程使用)
+
+    Args:
+        parser (PDFParser): 父进程中的解析器
+    """
+    global _worker_parser
+    parser._pdf = fitz.open(parser.file_path)
+    parser._pixmap = None
+    # 重建大模型客户端, 不与父进程共享 HTTP 连接
+    for model in (parser.llm, parser.vlm):
+        if model is not None:
+            model.reset_client()
+    parser.cache_path = os.path.join(parser.cache_path, str(os.getpid()))
+    os.makedirs(parser.cache_path, exist_ok=True)
+    _worker_parser = parser
+
+
+def _render_and_parse(page_index: int) -> Page:
+    """ 子进程中解析单个页面
+
+    Args:
+        page_index (int): 页码, 从0开始计数
+
+    Returns:
+        Page: 文档页面
+    """
+    return _worker_parser.get_page(page_index)
 
 
 class PDFParser(Parser):
 
+    _MAT_CACHE: dict[int, fitz.Matrix] = {}  # 各缩放倍数对应的变换矩阵, 按需创建并在实例间共享 (只读)
+
     def __init__(
             self,
             pdf_path: str,
@@ -75,11 +123,22 @@ class PDFParser(Parser):
         self.enhance_fn = enhance_fn
         self.kwargs = kwargs
 
+        # 复用的渲染缓冲区, 按需扩充到最大页面尺寸, 避免每页重新分配大块内存
+        self._pixmap: fitz.Pixmap | None = None
+
+        # 视觉模型结果缓存 (LRU), 以裁剪图像的哈希为键
+        self._vision_cache: OrderedDict[str, str] = OrderedDict()
+
+        self._rendered_count = 0  # 已渲染页面数, 每渲染 shrink_interval 页释放一次 MuPDF 内部缓存
+        self._models_invoked = False  # OCR/布局分析模型是否已在当前进程中推理过, 此后不再 fork 子进程
+
+        # 页面图像缓存, 同一页面在 get_contents 等方法中会被多次渲染
+        self._get_page_img = lru_cache(maxsize=8)(self._get_page_img)
+
         self.outline: list[list] = self._get_outline()
         
         self.cache_path = '.cache/pdf_cache'
-        if not os.path.exists(self.cache_path):
-            os.makedirs(self.cache_path)
+        os.makedirs(self.cache_path, exist_ok=True)
 
     def _get_outline(self) -> list[list]:
         """ 从 pdf 中读取大纲层级
@@ -89,7 +148,7 @@ class PDFParser(Parser):
         """
         outline = []
         for item in self._pdf.get_toc(simple=False):
-            h = self._pdf[item[2] - 1].get_pixmap().height  # 宽高一律采用像素层面
+            h = self._pdf[item[2] - 1].rect.irect.height  # 宽高一律采用像素层面 (与 zoom=1 时的 pixmap 高度一致, 无需渲染)
             if self.anchor_priority:
                 match item[3]['kind']:
                     case 4:
@@ -115,6 +174,9 @@ class PDFParser(Parser):
         """ 关闭文档
         """
         self._pdf.close()
+        self._pixmap = None
+        self._get_page_img.cache_clear()
+        self._vision_cache.clear()
         shutil.rmtree(self.cache_path)
 
     def get_catalogue_index_by_vlm(
@@ -130,17 +192,21 @@ class PDFParser(Parser):
         Returns:
             tuple[int, int]: 目录页起始页和终止页页码
         """
-        catalogue = []
-        for index in range(int(self._pdf.page_count * rate)):
-            img = self._get_page_img(index, zoom=2)
-            file_path = os.path.join(self.cache_path, f'{index}.png')
-            Image.fromarray(img).save(file_path)
-            prompt_, instruction = self.vl_prompt.get_catalogue_prompt()
-            vlm.instruction = instruction
-            res = vlm.image_chat(file_path, prompt_)
-            if res.startswith('是'):
-                catalogue.append(index)
-        shutil.rmtree(self.cache_path)
+        # 先渲染全部页面并在线程池中编码保存, 再一次性批量提交给视觉模型
+        indices = range(int(self._pdf.page_count * rate))
+        file_paths = [os.path.join(self.cache_path, f'{index}.png') for index in indices]
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+            # 页面在主线程中依次渲染, 编码保存在线程池中进行; 编码异常会在取结果时抛出
+            saved = list(executor.map(lambda path, img: cv2.imwrite(path, img, _PNG_PARAMS),
+                                      file_paths,
+                                      (self._get_page_img(index, zoom=2) for index in indices)))
+        if not all(saved):  # 保存失败时 image_chat 会把路径当作 url 发送, 必须在此处报错
+            raise OSError(f'页面图像保存失败: {[p for p, ok in zip(file_paths, saved) if not ok]}')
+        prompt_, instruction = self.vl_prompt.get_catalogue_prompt()
+        vlm.instruction = instruction
+        results = vlm.batch_image_chat(file_paths, prompt_)
+        catalogue = [index for index, (res, _) in enumerate(results) if res.startswith('是')]
+        clear_directory(self.cache_path, sub_directory=False)  # 保留缓存目录, 后续解析页面时仍需使用
 
         return get_longest_seq(catalogue)
 
@@ -163,7 +229,7 @@ class PDFParser(Parser):
 
         outline: list = []
         for i in range(len(r2)):
-            level = int(re.findall(r'\d+', r2[i][1])[0])
+            level = int(_DIGIT_RE.search(r2[i][1]).group())
             if str(lines[i][1]).isdigit():
                 outline.append([level, lines[i][0], int(lines[i][1]) + offset, (-1, -1)])
         self.outline = outline
@@ -184,15 +250,18 @@ class PDFParser(Parser):
         """
 
         self.outline = []
-        lines = []
+        # 每个目录页单独整理 (避免单次生成过长被截断), 全部请求并发提交后按页合并
+        prompts = []
         for index in range(start_index, end_index + 1):
             page = self.get_page(index)
             text_contents = '\n'.join(
                 [content.content for content in page.contents]).strip()
             prompt, instruction = self.parser_prompt.get_directory_prompt(text_contents)
             llm.instruction = instruction
-            res, _ = llm.chat(prompt).replace("，", ",")
-            lines.extend(get_list(res))
+            prompts.append(prompt)
+        results = llm.batch_chat(prompts)
+        # 一次性交给扩展批量提取, 只跨越一次 Python 与 Rust 的边界
+        lines = [line for page_lines in get_lists([res.replace("，", ",") for res, _ in results]) for line in page_lines]
         self._set_outline(lines, offset, llm)
 
     def set_outline_auto(self,
@@ -205,7 +274,8 @@ class PDFParser(Parser):
         titles = []
         for index in range(self._pdf.page_count):
             img = self._get_page_img(index, zoom=1)
-            res = self.structure_model(img)
+            self._models_invoked = True
+            res = self.structure_model(np.ascontiguousarray(img))
             titles.extend([[block['text'], index] for block in res if block['type'] == 'title'])
         self._set_outline(titles, 0, llm)
 
@@ -240,16 +310,13 @@ class PDFParser(Parser):
 
         stack.reverse()
 
-        # 设置各个书签的结束页码
-        def set_page_end(bks: list[BookMark]):
-            for idx in range(len(bks)):
-                if idx != len(bks) - 1:
-                    bks[idx].set_page_end(bks[idx + 1].page_start)
-                set_page_end(bks[idx].subs)
-
-        set_page_end(stack)
-        stack[-1].set_page_end(
-            PageIndex(index=self._pdf.page_count - 1, anchor=(-1, -1)))
+        # 设置各个书签的结束页码: 为下一个同级书签的起始页, 最后一个则与上级书签的结束页相同
+        pending = [(stack, PageIndex(index=self._pdf.page_count - 1, anchor=(-1, -1)))]
+        while pending:
+            bks, parent_end = pending.pop()
+            for idx, bk in enumerate(bks):
+                bk.page_end = bks[idx + 1].page_start if idx != len(bks) - 1 else parent_end
+                pending.append((bk.subs, bk.page_end))
 
         return stack
 
@@ -264,7 +331,13 @@ class PDFParser(Parser):
         """
 
         def remove_blanks(s):
-            return re.sub(re.compile(r'\s+'), '', s)
+            return s.translate(_WS_TABLE)
+
+        # 定位条件在所有页面间共享, 循环外只计算一次
+        x, y = bookmark.page_start.anchor
+        use_anchor = not (x == -1 and y == -1)  # 使用 anchor 定位, 否则使用内容定位
+        title = remove_blanks(bookmark.title)
+        title_type = ContentType.Title
 
         # 获取书签对应的页面内容
         contents: list[Content] = []
@@ -274,40 +347,50 @@ class PDFParser(Parser):
             page_contents = self.get_page(index).contents
 
             if index == bookmark.page_start.index:
-                idx = 0
-                x, y = bookmark.page_start.anchor
-                title = remove_blanks(bookmark.title)
-
-                if x == -1 and y == -1:  # 使用内容定位
-                    condition = lambda s: (
-                            s.type == ContentType.Title and remove_blanks(s.content) in remove_blanks(title))
-                else:  # 使用 anchor 定位
-                    condition = lambda s: (s.bbox[0] > x and s.bbox[1] > y)
-
-                for i, content in enumerate(page_contents):
-                    if condition(content):
-                        idx = i
-                        break
-
+                if use_anchor:
+                    idx = next((i for i, s in enumerate(page_contents) if s.bbox[0] > x and s.bbox[1] > y), 0)
+                else:
+                    idx = next((i for i, s in enumerate(page_contents)
+                                if s.type == title_type and remove_blanks(s.content) in title), 0)
                 page_contents = page_contents[idx:]
 
             if index == bookmark.page_end.index:
-                idx = len(page_contents)
-                x, y = bookmark.page_start.anchor
-
-                if x == -1 and y == -1:  # 使用内容定位
-                    condition = lambda s: (s.type == ContentType.Title)
-                else:  # 使用 anchor 定位
-                    condition = lambda s: (s.bbox[0] > x and s.bbox[1] > y)
-                for i, content in enumerate(page_contents):
-                    if condition(content):
-                        idx = i
-                        break
+                if use_anchor:
+                    idx = next((i for i, s in enumerate(page_contents) if s.bbox[0] > x and s.bbox[1] > y),
+                               len(page_contents))
+                else:
+                    idx = next((i for i, s in enumerate(page_contents) if s.type == title_type), len(page_contents))
                 page_contents = page_contents[:idx]
 
             contents.extend(page_contents)
         return contents
 
+    def _render_page(self, pdf_page: fitz.Page, mat: fitz.Matrix) -> ndarray:
+        """ 将页面渲染到复用的缓冲区中
+
+        Args:
+            pdf_page (fitz.Page): 页面
+            mat (fitz.Matrix): 变换矩阵
+
+        Returns:
+            ndarray: 缓冲区上的 RGB 视图, 下一次渲染时会被覆盖
+        """
+        irect = (pdf_page.rect * mat).irect
+        w, h = irect.width, irect.height
+        if self._pixmap is None or self._pixmap.width < w or self._pixmap.height < h:
+            width, height = w, h
+            if self._pixmap is not None:
+                width, height = max(width, self._pixmap.width), max(height, self._pixmap.height)
+            self._pixmap = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, width, height), False)
+        pm = self._pixmap
+        pm.clear_with(255)  # 白色背景
+        dev = fitz.Device(pm, None)
+        if irect.x0 or irect.y0:
+            mat = mat * fitz.Matrix(1, 0, 0, 1, -irect.x0, -irect.y0)  # 平移到缓冲区左上角
+        pdf_page.run(dev, mat)
+        dev.close()
+        return np.frombuffer(pm.samples_mv, dtype=np.uint8).reshape(pm.height, pm.width, 3)[:h, :w]
+
     def _get_page_img(self, page_index: int, zoom: int = 1) -> ndarray:
         """ 获取页面的图像对象
 
@@ -316,17 +399,24 @@ class PDFParser(Parser):
             zoom (int, optional): 缩放倍数. Defaults to 1.
 
         Returns:
-            _type_: opencv 转换后的图像对象
+            ndarray: opencv 格式 (BGR) 的图像对象, 为 RGB 数据上的步长视图 (只读, 结果会被缓存)
         """
         pdf_page = self._pdf[page_index]
-        mat = fitz.Matrix(zoom, zoom)
-        pm = pdf_page.get_pixmap(matrix=mat, alpha=False)
-        # 图片过大则放弃缩放
-        if pm.width > 2000 or pm.height > 2000:
-            pm = pdf_page.get_pixmap(matrix=fitz.Matrix(1, 1), alpha=False)
-        img = Image.frombytes("RGB", (pm.width, pm.height), pm.samples)
-        img = cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
-        return img
+        rect = pdf_page.rect
+        # 图片过大则放弃缩放, 渲染前根据页面尺寸确定缩放倍数, 避免重复渲染
+        if rect.width * zoom > 2000 or rect.height * zoom > 2000:
+            zoom = 1
+        if (mat := self._MAT_CACHE.get(zoom)) is None:
+            mat = self._MAT_CACHE[zoom] = fitz.Matrix(zoom, zoom)
+        img = self._render_page(pdf_page, mat).copy()  # 从复用的缓冲区中拷贝出来, 只发生一次拷贝
+        img.flags.writeable = False
+
+        self._rendered_count += 1
+        shrink_interval = self.kwargs.get('shrink_interval', 10)  # 小于1时不主动释放
+        if shrink_interval >= 1 and self._rendered_count % shrink_interval == 0:
+            fitz.TOOLS.store_shrink(100)  # 释放 MuPDF 内部缓存 (字体、图像等), 避免长文档中内存持续增长
+        # 通过步长视图翻转通道 RGB -> BGR, 不移动数据, 需要连续内存的调用方自行转换
+        return img[:, :, ::-1]
 
     def get_page(self, page_index: int) -> Page:
         """ 获取文档页面
@@ -341,10 +431,11 @@ class PDFParser(Parser):
         pdf_page = self._pdf[page_index]
         img = self._get_page_img(page_index, zoom=zoom)
 
-        if self.enhance_fn is not None: # 自定义增强函数
-            img = self.enhance_fn(img)
+        if self.enhance_fn is not None: # 自定义增强函数 (缓存的图像只读, 传入副本)
+            img = self.enhance_fn(img.copy())
         
-        img_gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        # 再次翻转得到连续的 RGB 视图, opencv 无需额外拷贝
+        img_gray = cv2.cvtColor(img[:, :, ::-1], cv2.COLOR_RGB2GRAY)
         
         h, w, _ = img.shape
         
@@ -363,9 +454,13 @@ class PDFParser(Parser):
         
         # 文本区域 (text/title) 和布局检测使用 img_sharpen 对象
         # 非文本区域使用 img 对象
+        self._models_invoked = True
         blocks = self.structure_model(img_sharpen)
 
-        def save_block(block_: StructureResult, img_: ndarray, idx: int) -> None | str:
+        # 整页文字只解析一次, 各区域复用同一个 TextPage, 避免每次 get_textbox 都重新解析页面内容流
+        textpage = None if self.ocr_priority else pdf_page.get_textpage()
+
+        def crop_block(block_: StructureResult, img_: ndarray) -> None | ndarray:
             wt, ht = self.kwargs.get('wt', 20), self.kwargs.get('ht', 5)  # 切割子图, 向左右扩充wt, 向上扩充ht
             x1, y1, x2, y2 = block_['bbox']
             type_ = block_['type']
@@ -376,14 +471,19 @@ class PDFParser(Parser):
             if type_ == 'figure' and ((x2 - x1) < 150 or (y2 - y1) < 150):
                 return  # 图片过小
             # 裁剪图像
-            cropped_img = Image.fromarray(img_).crop((x1, y1, x2, y2))
+            x1, y1, x2, y2 = round(x1), round(y1), round(x2), round(y2)
+            return img_[y1:y2, x1:x2]
+
+        def save_block(block_: StructureResult, img_: ndarray, idx: int, cropped: ndarray = None) -> None | str:
+            if cropped is None and (cropped := crop_block(block_, img_)) is None:
+                return
+            type_ = block_['type']
             border_size = self.kwargs.get('cropped_border_size', 20)
-            new_size = (cropped_img.width + 2*border_size, cropped_img.height + 2*border_size)
-            bordered_img = Image.new('RGB', new_size, 'white')
-            bordered_img.paste(cropped_img, (border_size, border_size))
-            
+            bordered_img = cv2.copyMakeBorder(cropped, border_size, border_size, border_size, border_size,
+                                              cv2.BORDER_CONSTANT, value=(255, 255, 255))
+
             path = os.path.join(self.cache_path, f'{idx}_{str(shortuuid.uuid())}_{type_}.png')
-            bordered_img.save(path)
+            cv2.imwrite(path, bordered_img, _PNG_PARAMS)
             return path
 
         def set_text_auto(block_: StructureResult, idx: int) -> None:
@@ -392,8 +492,8 @@ class PDFParser(Parser):
             if block_.get('text', None) is not None:  # 已经设置过 text 属性
                 pass
             else:
-                res = pdf_page.get_textbox(bbox).replace('\n', '')  # 直接读取
-                if len(res) != 0 and not bool(re.search(r'[\uFFFD]', res)) and not self.ocr_priority:
+                res = '' if textpage is None else pdf_page.get_textbox(bbox, textpage=textpage).replace('\n', '')  # 直接读取
+                if len(res) != 0 and _REPL_CHAR not in res:
                     block_['text'] = res
                 elif path := save_block(block_, img_sharpen, idx):  # OCR
                     res = self.ocr_model(path)
@@ -407,10 +507,23 @@ class PDFParser(Parser):
                     block_['text'] = res
         
         def set_text_by_vlm(block_: StructureResult, idx: int) -> None:
-            if file_path := save_block(block_, img, idx):
+            if (cropped := crop_block(block_, img)) is None:
+                return
+            # 重复出现的图像 (页眉、水印、章节横幅等) 直接复用视觉模型的结果
+            digest = hashlib.blake2b(str(cropped.shape).encode(), digest_size=16)
+            digest.update(cropped.tobytes())
+            key = digest.hexdigest()
+            if (text := self._vision_cache.get(key)) is not None:
+                self._vision_cache.move_to_end(key)
+            else:
+                file_path = save_block(block_, img, idx, cropped)
                 prompt, instruction = self.vl_prompt.get_ocr_prompt()
                 self.vlm.instruction = instruction
-                block_['text'] = self.vlm.image_chat(file_path, prompt)
+                text, _ = self.vlm.image_chat(file_path, prompt)
+                self._vision_cache[key] = text
+                if len(self._vision_cache) > self.kwargs.get('vision_cache_size', 20):
+                    self._vision_cache.popitem(last=False)
+            block_['text'] = text
 
         for idx, block in enumerate(blocks):
             type_ = block['type']
@@ -438,13 +551,41 @@ class PDFParser(Parser):
 
         return Page(page_index=page_index + 1, contents=contents)
 
-    def get_pages(self) -> list[Page]:
+    def get_pages(self, workers: int = 1) -> list[Page]:
         """ 获取pdf文档所有页面
 
+        Args:
+            workers (int, optional): 并行解析的进程数, 大于1时使用 fork 启动的进程池.
+                子进程直接继承父进程中的模型, 调用前这些模型不能执行过推理 (已初始化的推理线程池不保证 fork 安全),
+                因此应在 set_outline_by_catalogue、set_outline_auto 和 get_page 等方法之前调用.
+                不支持 fork 的平台、OCR/布局分析模型运行在 GPU 上或模型已执行过推理时退回顺序解析.
+                每个进程中的模型各自占用 cpu_threads 个线程, 构造模型时应将可用核心数除以 workers 分配. Defaults to 1.
+
         Returns:
             list[Page]: 页面列表
         """
-        pages: list[Page] = []
-        for index in range(0, self._pdf.page_count):
-            pages.append(self.get_page(page_index=index))
-        return pages
+        if workers > 1 and 'fork' not in multiprocessing.get_all_start_methods():
+            logger.warning('当前平台不支持 fork, 退回顺序解析')
+            workers = 1
+        if workers > 1 and any(not str(model.device).startswith('cpu') for model in (self.structure_model, self.ocr_model)):
+            logger.warning('OCR/布局分析模型运行在 GPU 上, 无法在 fork 出的子进程中使用, 退回顺序解析')
+            workers = 1
+        if workers > 1 and self._models_invoked:
+            logger.warning('OCR/布局分析模型已执行过推理, fork 后的状态不保证安全, 退回顺序解析')
+            workers = 1
+
+        if workers <= 1:
+            pages: list[Page] = []
+            try:
+                for index in range(0, self._pdf.page_count):
+                    pages.append(self.get_page(page_index=index))
+            finally:
+                fitz.TOOLS.store_shrink(100)
+            return pages
+
+        # 使用 fork 启动子进程, 模型对象直接由子进程继承而无需序列化
+        with ProcessPoolExecutor(max_workers=workers,
+                                 mp_context=multiprocessing.get_context('fork'),
+                                 initializer=_init_worker,
+                                 initargs=(self,)) as executor:
+            return list(executor.map(_render_and_parse, range(self._pdf.page_count), chunksize=4))
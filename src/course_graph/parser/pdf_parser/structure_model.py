@@ -12,6 +12,7 @@ from paddleocr import PPStructure
 from doclayout_yolo import YOLOv10
 import json
 from course_graph._core import structure
+import paddle
 
 
 class StructureResult(TypedDict, total=False):
@@ -25,6 +26,8 @@ class StructureResult(TypedDict, total=False):
 
 class StructureModel(ABC):
 
+    device: str = 'cpu'  # 模型运行设备
+
     @abstractmethod
     def predict(self, img: ndarray) -> list[StructureResult]:
         """ 生成布局分析结果
@@ -43,11 +46,25 @@ class StructureModel(ABC):
 
 class PaddleStructure(StructureModel):
 
-    def __init__(self) -> None:
+    def __init__(self,
+                 enable_mkldnn: bool = True,
+                 cpu_threads: int | None = None,
+                 precision: Literal['fp32', 'fp16', 'int8'] = 'fp32',
+                 **kwargs) -> None:
         """ 飞桨布局分析模型 ref: https://github.com/PaddlePaddle/PaddleOCR/
+
+        Args:
+            enable_mkldnn (bool, optional): CPU 推理时启用 MKL-DNN 加速. Defaults to True.
+            cpu_threads (int | None, optional): CPU 推理线程数, 为 None 时使用 Paddle 的默认值. Defaults to None.
+            precision (Literal['fp32', 'fp16', 'int8'], optional): 推理精度, int8 需要通过 layout_model_dir 等参数指定量化模型. Defaults to 'fp32'.
+            **kwargs (dict, optional): 其它 PPStructure 参数.
         """
         super().__init__()
-        self.pp = PPStructure(table=False, ocr=True, show_log=False)
+        if cpu_threads is not None:
+            kwargs['cpu_threads'] = cpu_threads
+        self.device = paddle.device.get_device() if kwargs.get('use_gpu', True) else 'cpu'
+        self.pp = PPStructure(table=False, ocr=True, show_log=False,
+                              enable_mkldnn=enable_mkldnn, precision=precision, **kwargs)
         self.origin2type = {
             'header': 'abandon',
             'footer': 'abandon',
@@ -1,8 +1,7 @@
 use pyo3::prelude::*;
 use rand::Rng;
 
-#[pyfunction]
-pub fn get_list(text: &str) -> PyResult<Vec<String>> {
+fn extract_list(text: &str) -> Vec<String> {
     let mut list_string = String::new();
     let mut stack = 0;
     let mut chars = text.chars();
@@ -24,7 +23,18 @@ pub fn get_list(text: &str) -> PyResult<Vec<String>> {
         }
     }
 
-    Ok(result)
+    result
+}
+
+#[pyfunction]
+pub fn get_list(text: &str) -> PyResult<Vec<String>> {
+    Ok(extract_list(text))
+}
+
+#[pyfunction]
+pub fn get_lists(texts: Vec<String>) -> PyResult<Vec<Vec<String>>> {
+    // 批量处理, 只需跨越一次 Python 与 Rust 的边界
+    Ok(texts.iter().map(|text| extract_list(text)).collect())
 }
 
 #[pyfunction]
@@ -229,6 +239,7 @@ pub fn structure(
 #[pymodule]
 fn _core(m: &Bound<'_, PyModule>) -> PyResult<()> {
     m.add_function(wrap_pyfunction!(get_list, m)?)?;
+    m.add_function(wrap_pyfunction!(get_lists, m)?)?;
     m.add_function(wrap_pyfunction!(structure, m)?)?;
     m.add_function(wrap_pyfunction!(get_longest_seq, m)?)?;
     m.add_function(wrap_pyfunction!(optimize_length, m)?)?;